@@ -45,11 +45,37 @@ class ColorFormatter(logging.Formatter):
         },
     }
 
+    __NO_COLOR_CODES = ('', '')
+
     def __init__(self, fmt=COLOR_FORMAT, *,
                  level_colors=LEVEL_COLORS, color=True):
         super().__init__(fmt=fmt)
-        self.__level_colors = level_colors
         self.__color = color
+        self.__level_codes = self.__get_level_codes(level_colors)
+
+    @classmethod
+    def __get_level_codes(cls, level_colors):
+        old_value = os.environ.get(cls.__FORCE_COLOR_ENV_NAME)
+
+        # `colored` always return colors with env variable FORCE_COLOR
+        os.environ[cls.__FORCE_COLOR_ENV_NAME] = "1"
+
+        # Use termcolor `colored` function to get
+        # color and reset color codes per level
+        level_codes = {
+            level: tuple(
+                termcolor.colored(cls.__SPLIT_TOKEN, **color)
+                         .split(cls.__SPLIT_TOKEN)
+            )
+            for level, color in level_colors.items()
+        }
+
+        if old_value is not None:
+            os.environ[cls.__FORCE_COLOR_ENV_NAME] = old_value
+        else:
+            del os.environ[cls.__FORCE_COLOR_ENV_NAME]
+
+        return level_codes
 
     def formatMessage(self, record):
         # Prefer lower-case level name
@@ -60,27 +86,11 @@ class ColorFormatter(logging.Formatter):
         return self.__format_with_color(s, record.levelno)
 
     def __format_with_color(self, s: str, level: int):
-        if not self.__color:
-            color_code, reset_code = '', ''
+        if self.__color:
+            color_code, reset_code = self.__level_codes.get(
+                level, self.__NO_COLOR_CODES)
         else:
-            color = self.__level_colors.get(level)
-
-            old_value = os.environ.get(self.__FORCE_COLOR_ENV_NAME)
-
-            # `colored` always return colors with env variable FORCE_COLOR
-            os.environ[self.__FORCE_COLOR_ENV_NAME] = "1"
-
-            # Use termcolor `colored` function to get
-            # color and reset color codes
-            color_code, reset_code = (
-                termcolor.colored(self.__SPLIT_TOKEN, **color)
-                         .split(self.__SPLIT_TOKEN)
-            )
-
-            if old_value is not None:
-                os.environ[self.__FORCE_COLOR_ENV_NAME] = old_value
-            else:
-                del os.environ[self.__FORCE_COLOR_ENV_NAME]
+            color_code, reset_code = self.__NO_COLOR_CODES
 
         # Format message with inline color
         return s % {self.__COLOR: color_code, self.__RESET: reset_code}
@@ -9,9 +9,10 @@ import types
 import subprocess
 import pathlib
 import socket
+import selectors
 import enum
-import time
 import atexit
+import collections
 
 import synsignals
 import colorformatter
@@ -20,6 +21,13 @@ import yaspin
 import yaspin.spinners
 
 
+# Compiled once: stripping color codes happens per subprocess-output line
+ANSI_COLOR_REGEX = re.compile(r'\033\[[0-9;]+m')
+
+# Two-char nvd package change markers, e.g. `[U.]`
+CHANGE_MARKER_REGEX = re.compile(r'\[([ARUDC]).\]')
+
+
 class ColorOption(enum.StrEnum):
     AUTO = enum.auto()
     ALWAYS = enum.auto()
@@ -38,19 +46,38 @@ class CliProgram:
         f"nixosConfigurations.{HOSTNAME}.config.system.build.toplevel"
     EXIT_ERR_CODE = 1
     EXIT_SIG_CODE_SHIFT = 128
-    POLLING_PROC_SECS = 0.1
+    WAIT_PROC_SECS = 1
+    READ_PROC_CHUNK = 65536
     SIG_TO_TERM_SUBPROC = signal.SIGTERM
     SIG_TO_KILL_SUBPROC = signal.SIGKILL
     TERM_SUBPROC_TIMEOUT = 5
+    WORKER_PONG_TIMEOUT = 1
     NO_COLOR_ENV_NAME = "NO_COLOR"
+    # Env-derived color flags don't change mid-run, probe them once
+    COLOR_FORCED = "FORCE_COLOR" in os.environ
+    COLOR_DISABLED = (
+        NO_COLOR_ENV_NAME in os.environ or
+        "ANSI_COLORS_DISABLED" in os.environ or
+        os.environ.get("TERM") == "dumb"
+    )
+    # (stdout_colored, stderr_colored) for --color=auto;
+    # env and TTY state are frozen at startup
+    AUTO_COLOR = (
+        (True, True) if COLOR_FORCED else
+        (False, False) if COLOR_DISABLED else
+        (STDOUT_IS_A_TTY, STDERR_IS_A_TTY)
+    )
     PY_SH_FD = int(os.environ["PY_SH_FD"])
     SH_PY_FD = int(os.environ["SH_PY_FD"])
     COMMIT_MSG_W_FD = int(os.environ["COMMIT_MSG_W_FD"])
     IFS = os.environ["CMD_IFS"]
+    EXIT_PAYLOAD = b"exit\n"
     TMP_DIR = pathlib.Path(os.environ["TMP_DIR"])
 
     def __init__(self):
         self.from_worker_file = os.fdopen(self.SH_PY_FD, "r")
+        # Encoded payloads of repeating argument-less worker tasks
+        self._cmd_payloads = {}
         atexit.register(self.atexit_handler)
         self.running_subproc = None
         self._stdout = sys.stdout
@@ -67,6 +94,12 @@ class CliProgram:
                 "unrecognized arguments: " + ' '.join(self.args._argv),
             )
 
+        # `os.environ` is not mutated after startup,
+        # so build the subprocess env variants once
+        self._subproc_env = dict(os.environ)
+        self._subproc_env_no_color = {
+            **self._subproc_env, self.NO_COLOR_ENV_NAME: "1"}
+
         self.spinner = self.get_spinner()
         self.current_system_closure = self.get_current_system_closure()
         self.upgraded_system_closure = None
@@ -74,11 +107,28 @@ class CliProgram:
         self.setup_signals()
         self.setup_excepthook()
 
+        self._nixos_config_target = (f"{self.TMP_DIR}#"
+                                     f"{self.NIXOS_CONFIG_FLAKE_OUT}")
+        # strsignal goes through libc, resolve the messages up front
+        self._sig_msgs = {
+            int(s): f"'{signal.strsignal(int(s))}' signal received"
+            for s in os.environ["TERM_CORE_SIGS"].split()
+        }
+
     def atexit_handler(self):
         # To avoid BrokenPipe ignored exception at exit
         self.std_streams_to_devnull()
-        self.write_to_pipe(['exit'])
-        self.from_worker_file.close()
+
+        # The worker may be gone already, don't raise during shutdown
+        try:
+            os.write(self.PY_SH_FD, self.EXIT_PAYLOAD)
+        except OSError:
+            pass
+
+        try:
+            self.from_worker_file.close()
+        except OSError:
+            pass
 
     def setup_excepthook(self):
         # Uncaught exceptions
@@ -92,6 +142,14 @@ class CliProgram:
 
         synsignals.set(signals)
 
+        # Self-pipe so waits in `selectors.select`
+        # are preempted by incoming signals
+        wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        signal.set_wakeup_fd(wakeup_w)
+        self.sig_wakeup_fd = wakeup_r
+
         # Unblock all blocked signals
         signal.pthread_sigmask(signal.SIG_UNBLOCK, signal.valid_signals())
 
@@ -110,8 +168,9 @@ class CliProgram:
             self.spinner_start("yellow")
 
             try:
-                # Waiting for termination
-                proc.communicate(timeout=self.TERM_SUBPROC_TIMEOUT)
+                # Waiting for termination.
+                # `run_cmd` owns the output pipes, so don't `communicate`
+                proc.wait(timeout=self.TERM_SUBPROC_TIMEOUT)
             except subprocess.TimeoutExpired:
                 # Last resort
                 os.killpg(proc.pid, self.SIG_TO_KILL_SUBPROC)
@@ -120,7 +179,7 @@ class CliProgram:
                 self.logger.warning(
                   "  SIGKILL has been sent to the subprocess as a last resort")
 
-                proc.communicate()
+                proc.wait()
 
             self.spinner_stop()
 
@@ -137,7 +196,7 @@ class CliProgram:
         current_system_closure = self.run_privileged_task(
             "get_current_system_closure")
 
-        self.logger.debug(f"{current_system_closure=}")
+        self.logger.debug("current_system_closure=%r", current_system_closure)
         return current_system_closure
 
     def run_cmd(self, cmd: typing.List[str], desc="", msg_on_success="",
@@ -146,14 +205,17 @@ class CliProgram:
                 msg_on_success_loglevel=logging.INFO,
                 env_to_update: dict = {},
                 **kwargs):
-        stderr_out = self.debug_mode or stderr_out
+        # Evaluate the property once per call, not per drained chunk
+        debug = self.debug_mode
+
+        stderr_out = debug or stderr_out
 
         if desc:
             self.logger.info(desc)
 
         command = " ".join(cmd)
 
-        self.logger.debug("> " + command)
+        self.logger.debug("> %s", command)
 
         if not stderr_out and with_spinner:
             self.spinner_start()
@@ -162,59 +224,97 @@ class CliProgram:
 
         no_color = not self.colored_stderr
 
-        env = os.environ.copy()
-
-        if no_color:
-            env[self.NO_COLOR_ENV_NAME] = "1"
+        env = self._subproc_env_no_color if no_color else self._subproc_env
 
         if env_to_update:
-            env.update(env_to_update)
+            env = {**env, **env_to_update}
 
         proc = subprocess.Popen(
             cmd,
-            stderr=subprocess.STDOUT if not stderr_out else None,
+            stderr=subprocess.PIPE,
             stdout=subprocess.PIPE,
             env=env,
             start_new_session=True,
-            text=True,
             **kwargs
         )
 
         self.running_subproc = proc
 
-        os.set_blocking(proc.stdout.fileno(), False)
+        stdout_fd = proc.stdout.fileno()
+        stderr_fd = proc.stderr.fileno()
+        os.set_blocking(stdout_fd, False)
+        os.set_blocking(stderr_fd, False)
+
+        sel = selectors.DefaultSelector()
+        sel.register(proc.stdout, selectors.EVENT_READ)
+        sel.register(proc.stderr, selectors.EVENT_READ)
+        sel.register(self.sig_wakeup_fd, selectors.EVENT_READ)
+
+        out_buf = bytearray()
+        err_buf = bytearray()
+        # stderr is echoed live when requested, stdout only in debug mode
+        pumps = {
+            stdout_fd: (out_buf, debug),
+            stderr_fd: (err_buf, stderr_out),
+        }
+
+        # Stream both pipes until EOF, so all output lands in the
+        # buffers right here and no post-exit tail drain is needed
+        while pumps:
+            # Block until the subprocess writes or a signal arrives
+            events = sel.select(timeout=self.WAIT_PROC_SECS)
+
+            if not events and proc.poll() is not None:
+                # The subprocess has exited and only a quiet pipe
+                # inherited by some descendant is left open
+                break
+
+            for key, _ in events:
+                if key.fd == self.sig_wakeup_fd:
+                    # Drain the wakeup pipe
+                    os.read(self.sig_wakeup_fd, 4096)
+                    continue
+
+                buf, echo = pumps[key.fd]
+                if self.read_proc_output(key.fd, buf,
+                                         echo=echo, no_color=no_color):
+                    # EOF: stop watching this pipe
+                    sel.unregister(key.fileobj)
+                    del pumps[key.fd]
 
-        stdout_data = ""
-        while proc.poll() is None:
             # While a subprocess is running
             # it's possible that a signal is received
             synsignals.handle()
 
-            while line := proc.stdout.readline():
-                if no_color:
-                    line = self.clear_color(line)
-                stdout_data += line
-                if self.debug_mode:
-                    sys.stderr.write(line)
+        # The child may keep running after closing its pipes;
+        # keep serving signals while waiting for it to exit
+        while proc.poll() is None:
+            if sel.select(timeout=self.WAIT_PROC_SECS):
+                # Drain the wakeup pipe
+                os.read(self.sig_wakeup_fd, 4096)
 
-            # So as not to be intrusive
-            time.sleep(self.POLLING_PROC_SECS)
+            synsignals.handle()
+
+        sel.close()
 
         self.running_subproc = None
 
         self.spinner_stop()
 
-        tail = proc.stdout.read()
-        if no_color:
-            tail = self.clear_color(tail)
-        stdout_data += tail
-
-        if tail and self.debug_mode:
-            sys.stderr.write(tail)
-
         retcode = proc.returncode
 
+        stdout_data = out_buf.decode("utf-8", "replace")
+        if no_color:
+            stdout_data = self.clear_color(stdout_data)
+
         if retcode != os.EX_OK:
+            if not stderr_out and err_buf:
+                # Show the failed subprocess stderr which was not echoed live
+                stderr_data = err_buf.decode("utf-8", "replace")
+                if no_color:
+                    stderr_data = self.clear_color(stderr_data)
+                sys.stderr.write(stderr_data)
+
             msg = f"`{command}` subprocess error"
             self.logger.error(msg)
 
@@ -227,10 +327,34 @@ class CliProgram:
         self.logger.debug("> done")
         return stdout_data
 
+    def read_proc_output(self, fd: int, buf: bytearray, *,
+                         echo=False, no_color=False) -> bool:
+        # The fd is non-blocking, so bulk-read everything available.
+        # Returns True when EOF is reached
+        try:
+            while chunk := os.read(fd, self.READ_PROC_CHUNK):
+                buf += chunk
+
+                if echo:
+                    text = chunk.decode("utf-8", "replace")
+                    if no_color:
+                        text = self.clear_color(text)
+
+                    sys.stderr.write(text)
+                    sys.stderr.flush()
+        except BlockingIOError:
+            # Nothing more to read for now
+            return False
+
+        return True
+
     @staticmethod
     def clear_color(text):
-        termcolor_regex = r'\033\[[0-9;]+m'
-        return re.sub(termcolor_regex, '', text)
+        if '\033' not in text:
+            # Common case: no color codes at all
+            return text
+
+        return ANSI_COLOR_REGEX.sub('', text)
 
     def parse_args(self):
         parser = argparse.ArgumentParser(
@@ -315,17 +439,7 @@ class CliProgram:
 
     # returns -> (stdout_colored: bool, stderr_colored: bool)
     def is_output_colored(self) -> (bool, bool):
-        if "FORCE_COLOR" in os.environ:
-            return (True, True)
-
-        if (
-            self.NO_COLOR_ENV_NAME in os.environ or
-            "ANSI_COLORS_DISABLED" in os.environ or
-            os.environ.get("TERM") == "dumb"
-        ):
-            return (False, False)
-
-        return (self.STDOUT_IS_A_TTY, self.STDERR_IS_A_TTY)
+        return self.AUTO_COLOR
 
     def get_formatter(self):
         return colorformatter.ColorFormatter(
@@ -420,12 +534,12 @@ class CliProgram:
 
     def get_nixos_flake_dir(self):
         flake_dir = self.args.flake
-        self.logger.debug(f"{flake_dir=}")
+        self.logger.debug("flake_dir=%r", flake_dir)
 
         flake_dir = self.run_privileged_task(
             "resolve_flake_dir", str(flake_dir))
 
-        self.logger.debug(f"  resolved to {flake_dir!r}")
+        self.logger.debug("  resolved to %r", flake_dir)
 
         if not self.is_flake_dir_exists():
             self.exit_with_error(f"{flake_dir}: no such directory")
@@ -450,7 +564,12 @@ class CliProgram:
         return flake_dir
 
     def get_sig_received_msg(self, signum: int):
-        return f"'{signal.strsignal(signum)}' signal received"
+        msg = self._sig_msgs.get(signum)
+
+        if msg is None:
+            msg = f"'{signal.strsignal(signum)}' signal received"
+
+        return msg
 
     def get_sig_exit_code(self, signum: int):
         return self.EXIT_SIG_CODE_SHIFT + signum
@@ -496,22 +615,25 @@ class CliProgram:
         return (self.logger.level == logging.DEBUG)
 
     def has_pkgs_changes(self) -> bool:
-        # Marker of updates in packages
-        regex = r"\[.+\]"
+        # nvd colors the marker characters individually, so strip
+        # the codes first; then stop at the first package change marker
+        diff = self.clear_color(self.diff)
 
-        return True if re.search(regex, self.diff) else False
+        return CHANGE_MARKER_REGEX.search(diff) is not None
 
     def count_changes(self):
         diff = self.clear_color(self.diff)
-        changes = types.SimpleNamespace()
 
-        changes.added = len(re.findall(r"\[A.\]", diff))
-        changes.removed = len(re.findall(r"\[R.\]", diff))
-        changes.upgraded = len(re.findall(r"\[U.\]", diff))
-        changes.downgraded = len(re.findall(r"\[D.\]", diff))
-        changes.changed = len(re.findall(r"\[C.\]", diff))
-        changes.all = (changes.added + changes.removed + changes.upgraded +
-                       changes.downgraded + changes.changed)
+        # Count all change categories in a single pass
+        counts = collections.Counter(CHANGE_MARKER_REGEX.findall(diff))
+
+        changes = types.SimpleNamespace()
+        changes.added = counts["A"]
+        changes.removed = counts["R"]
+        changes.upgraded = counts["U"]
+        changes.downgraded = counts["D"]
+        changes.changed = counts["C"]
+        changes.all = sum(counts.values())
 
         return changes
 
@@ -520,30 +642,34 @@ class CliProgram:
         if changes.all == 0:
             return "Config changes found"
 
-        stat = f"{changes.all} package changes: "
+        parts = []
 
         if changes.added > 0:
-            stat += f"{changes.added} added, "
+            parts.append(f"{changes.added} added")
         if changes.removed > 0:
-            stat += f"{changes.removed} removed, "
+            parts.append(f"{changes.removed} removed")
         if changes.upgraded > 0:
-            stat += f"{changes.upgraded} upgraded, "
+            parts.append(f"{changes.upgraded} upgraded")
         if changes.downgraded > 0:
-            stat += f"{changes.downgraded} downgraded, "
+            parts.append(f"{changes.downgraded} downgraded")
         if changes.changed > 0:
-            stat += f"{changes.changed} changed, "
+            parts.append(f"{changes.changed} changed")
 
-        stat = stat[:-2]
-
-        return stat
+        return f"{changes.all} package changes: " + ", ".join(parts)
 
     def process_diff(self) -> str:
-        self.diff = "\n".join(self.diff.split("\n")[2:])
+        # Drop the two header lines without splitting the whole diff
+        diff = self.diff
+
+        first_nl = diff.find("\n")
+        second_nl = diff.find("\n", first_nl + 1) if first_nl != -1 else -1
+
+        self.diff = diff[second_nl + 1:] if second_nl != -1 else ""
 
     @synsignals.add_handling
     def check_flake_dir(self):
         self.args.flake = self.get_nixos_flake_dir()
-        self.logger.info(f"found a nixos flake '{self.args.flake}'")
+        self.logger.info("found a nixos flake '%s'", self.args.flake)
 
     @synsignals.add_handling
     def update_lock_file(self):
@@ -554,9 +680,8 @@ class CliProgram:
 
     @synsignals.add_handling
     def build_nixos_system(self):
-        nixos_config = (f"{self.TMP_DIR}#"
-                        f"{self.NIXOS_CONFIG_FLAKE_OUT}")
-        self.logger.debug(f"{nixos_config=}")
+        nixos_config = self._nixos_config_target
+        self.logger.debug("nixos_config=%r", nixos_config)
 
         self.logger.info("building nixos system...")
 
@@ -569,7 +694,8 @@ class CliProgram:
 
         self.upgraded_system_closure = self.readline_from_worker()
 
-        self.logger.debug(f"{self.upgraded_system_closure=}")
+        self.logger.debug("self.upgraded_system_closure=%r",
+                          self.upgraded_system_closure)
 
     @synsignals.add_handling
     def diff_closures(self):
@@ -656,23 +782,30 @@ class CliProgram:
     def write_to_pipe_check(self, cmd: list[str]):
         self.write_to_pipe(cmd)
 
-        os.set_blocking(self.SH_PY_FD, False)
-        attempts = 100
-        while attempts > 0:
-            time.sleep(0.01)
-            pong = self.readline_from_worker()
-            if pong:
-                break
-            attempts -= 1
-        os.set_blocking(self.SH_PY_FD, True)
+        # Block until the worker responds instead of sleep polling
+        sel = selectors.DefaultSelector()
+        sel.register(self.SH_PY_FD, selectors.EVENT_READ)
+        ready = sel.select(timeout=self.WORKER_PONG_TIMEOUT)
+        sel.close()
+
+        pong = self.readline_from_worker() if ready else ""
 
         if pong != "PONG":
             self.exit_with_error("privileged process is not responding")
 
     def write_to_pipe(self, cmd: list[str]):
-        cmd = self.IFS.join(cmd) + "\n"
+        if len(cmd) == 1:
+            # The common case: a fixed task name without arguments
+            task = cmd[0]
+            payload = self._cmd_payloads.get(task)
+
+            if payload is None:
+                payload = (task + "\n").encode()
+                self._cmd_payloads[task] = payload
+        else:
+            payload = (self.IFS.join(cmd) + "\n").encode()
 
-        os.write(self.PY_SH_FD, cmd.encode())
+        os.write(self.PY_SH_FD, payload)
 
     def get_commit_msg(self):
         header = f"{self.NAME}: Auto commit\n\n"
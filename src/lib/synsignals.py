@@ -1,11 +1,12 @@
 import signal
 import enum
 import contextlib
+import collections
 
 
 _signals = None
 _signums = None
-_pending_signals = []
+_pending_signals = collections.deque()
 _handling_blocked = False
 
 
@@ -90,29 +91,30 @@ def add_handling(func):
 
 
 def handle():
+    global _pending_signals
+
     if _handling_blocked:
         return
 
+    # Snapshot the pending queue under a short mask window and
+    # drain the snapshot unmasked; signals arriving meanwhile are
+    # registered in the fresh queue and handled on the next call
     _block()
-    try:
-        while _pending_signals:
-            signum, frame = _pending_signals.pop(0)
-
-            handler = _signals[signum]
-
-            if handler is not None and handler != signal.SIG_IGN:
-                if handler != signal.SIG_DFL:
-                    handler(signum, frame)
-                else:
-                    prev_handler = signal.signal(signum, signal.SIG_DFL)
-                    signal.raise_signal(signum)
-                    signal.pthread_sigmask(signal.SIG_UNBLOCK, [signum])
+    batch, _pending_signals = _pending_signals, collections.deque()
+    _unblock()
 
-                    signal.pthread_sigmask(signal.SIG_BLOCK, [signum])
-                    signal.signal(signum, prev_handler)
+    for signum, frame in batch:
+        handler = _signals[signum]
 
-    finally:
-        _unblock()
+        if handler is not None and handler != signal.SIG_IGN:
+            if handler != signal.SIG_DFL:
+                handler(signum, frame)
+            else:
+                # The batch is drained unmasked, so the re-raised
+                # signal is delivered and acted upon immediately
+                prev_handler = signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+                signal.signal(signum, prev_handler)
 
 
 def get_pending_signals():
@@ -137,9 +139,10 @@ def unblock_handling():
 
 
 def _register_signal(signum, frame):
-    _block()
+    # Runs from a Python signal handler, i.e. between bytecodes on the
+    # main thread, so a plain deque append is already atomic w.r.t.
+    # `handle()` — no need to pay two sigmask syscalls per signal
     _pending_signals.append((signum, frame))
-    _unblock()
 
 
 def _block():